@@ -1,64 +1,191 @@
 import streamlit as st
-import os, re, json, requests, tempfile
-from docx import Document
+import os, io, re, json, zipfile, posixpath, requests
+from typing import IO, Any, Callable, Iterator, NamedTuple, cast
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from lxml import etree
+
+_json_loads: Callable[[bytes], Any]
+try:                                # 있으면 더 빠른 orjson 으로 API 응답을 파싱
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # ────────────────────────────────
 # 환경 변수 / secrets
 BING_API_KEY  = st.secrets.get("BING_API_KEY",  os.getenv("BING_API_KEY"))
 BING_ENDPOINT = st.secrets.get("BING_ENDPOINT", os.getenv("BING_ENDPOINT",
                     "https://bing-search-labor.cognitiveservices.azure.com"))
+SEARCH_URL    = f"{BING_ENDPOINT.rstrip('/')}/bing/v7.0/search"
 
 # ────────────────────────────────
+class Question(NamedTuple):
+    body:    str
+    keys:    tuple[str, ...]        # 보기 기호 (본문에 나온 순서)
+    choices: tuple[str, ...]        # keys 와 같은 순서의 보기 내용
+
+# ────────────────────────────────
+# 같은 엔드포인트를 반복 호출하므로 세션으로 TCP/TLS 연결을 재사용.
+# 스크립트는 rerun 마다 다시 실행되므로 cache_resource 로 프로세스당 하나만 만든다.
+@st.cache_resource
+def _get_session() -> requests.Session:
+    session = requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    if BING_API_KEY:
+        session.headers.update({"Ocp-Apim-Subscription-Key": BING_API_KEY})
+    return session
+
+# 다음 문항 검색을 사용자가 읽는 동안 미리 돌려 두는 스레드 풀 (프로세스당 하나)
+@st.cache_resource
+def _get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=4)
+
+# ────────────────────────────────
+# 같은 문항의 검색을 다시 누르면 API 를 재호출하지 않도록 1시간 캐시.
+# 오류는 예외로 올려 캐시에 남지 않게 하고, 화면 출력은 bing_search 가 맡는다.
+@st.cache_data(ttl=3600, show_spinner=False)
+def _bing_search_cached(query: str, top_n: int) -> list[dict]:
+    params: dict[str, str | int] = {"q": query, "count": top_n, "textFormat": "Raw"}
+    resp   = _get_session().get(SEARCH_URL, params=params, timeout=10)
+    if resp.status_code != 200:      # 200이 아니면 예외로 올리고 메시지는 bing_search 가 출력
+        raise requests.exceptions.HTTPError(response=resp)
+    # resp.json() 은 본문을 str 로 한 번 더 디코딩하므로 bytes 를 바로 파싱
+    data = _json_loads(resp.content).get("webPages", {}).get("value", [])
+    return [{"name": d["name"], "url": d["url"], "snippet": d.get("snippet", "")}
+            for d in data]
+
 def bing_search(query: str, top_n: int = 3) -> list[dict]:
     if not BING_API_KEY:
         st.error("BING_API_KEY가 없습니다. .streamlit/secrets.toml 또는 환경변수를 확인하세요.")
         return []
 
-    url = f"{BING_ENDPOINT.rstrip('/')}/bing/v7.0/search"
-    headers = {"Ocp-Apim-Subscription-Key": BING_API_KEY}
-    params  = {"q": query, "count": top_n, "textFormat": "Raw"}
-
+    # future 수명은 prefetch_searches 가 관리하므로 보통은 읽기만 한다
+    futures = st.session_state.get("prefetch", {})
+    fut     = futures.get((query, top_n))
+    if fut is not None and fut.cancel():    # 아직 큐에서 대기 중이면 빼고 지금 직접 요청
+        del futures[(query, top_n)]
+        fut = None
+    elif fut is not None and fut.done() and fut.exception() is not None:
+        fut = None                  # 미리 받아 둔 오류는 버리고 지금 다시 요청
     try:
-        resp = requests.get(url, headers=headers, params=params, timeout=10)
-        if resp.status_code != 200:      # 200이 아니면 상세 메시지 출력 후 종료
-            st.error(f"Bing API 오류 {resp.status_code}: {resp.text}")
-            return []
-        data = resp.json().get("webPages", {}).get("value", [])
-        return [{"name": d["name"], "url": d["url"], "snippet": d.get("snippet", "")}
-                for d in data]
+        return fut.result(timeout=10) if fut else _bing_search_cached(query, top_n)
+    except requests.exceptions.HTTPError as e:
+        resp = e.response           # _bing_search_cached 가 항상 response 를 실어 올린다
+        st.error(f"Bing API 오류 {resp.status_code}: {resp.text}" if resp is not None
+                 else f"Bing API 오류: {e}")
     except (requests.exceptions.ConnectionError,
             requests.exceptions.Timeout) as e:
         st.error(f"네트워크 오류: {e}")
+    except FutureTimeoutError:
+        st.error("네트워크 오류: Bing 응답 대기 시간(10초)을 넘었습니다.")
     except Exception as e:
         st.error(f"예기치 못한 오류: {e}")
     return []
 
+def prefetch_searches(queries: list[str], top_n: int = 3) -> None:
+    # 백그라운드에서 검색해 캐시를 데워 둔다. 결과·오류는 bing_search 에서 꺼낸다.
+    # 실패한 future 는 다시 걸지 않는다 (rerun 마다 API 를 두드리지 않도록 재시도는 버튼 클릭에서만).
+    if not BING_API_KEY:
+        return
+    old     = st.session_state.get("prefetch", {})
+    futures = {}
+    for query in queries:
+        fut = old.get((query, top_n))
+        if fut is None:
+            fut = _get_executor().submit(_bing_search_cached, query, top_n)
+        futures[(query, top_n)] = fut
+    for key, fut in old.items():    # 넘겨받은 문항 밖으로 밀려난 요청은 큐에서 뺀다
+        if key not in futures:
+            fut.cancel()
+    st.session_state["prefetch"] = futures
+
+def _search_query(q: Question) -> str:
+    return f"{q.body} 정답 해설"
+
 # ────────────────────────────────
-CHOICE_REGEX = r"([\u2460-\u2464])"     # ①②③④⑤
-
-def load_questions_from_docx(path: str):
-    doc   = Document(path)
-    text  = " ".join(p.text.strip() for p in doc.paragraphs if p.text.strip())
-    idxs  = [(m.start(), m.group()) for m in re.finditer(r"\d+\.\s*", text)]
-    idxs.append((len(text), None))
-
-    questions = []
-    for i in range(len(idxs) - 1):
-        start, _ = idxs[i]
-        end,  _  = idxs[i+1]
-        segment  = text[start:end].strip()
-
-        parts = re.split(CHOICE_REGEX, segment)
-        if len(parts) < 3:          # 보기 부족
+# 문항 번호(1.)와 보기 기호(①②③④⑤)를 한 번의 finditer 로 훑는다.
+# 보기가 ①④②⑤③ 처럼 두 단으로 섞여 있어도 기호 순서에 의존하지 않는다.
+_TOKEN_RE = re.compile(r"(\d+)\.\s*|([\u2460-\u2464])")
+
+def _make_question(text: str, body_start: int, marks: list[re.Match[str]],
+                   end: int) -> Question | None:
+    if len(marks) < 5:          # 보기 부족
+        return None
+    q_body  = text[body_start:marks[0].start()].strip()
+    stops   = [m.start() for m in marks[1:6]] + [end]
+    choices: dict[str, str] = {}
+    for m, stop in zip(marks[:5], stops):
+        choices[m.group()] = text[m.end():stop].strip()
+    return Question(q_body, tuple(choices), tuple(choices.values()))
+
+# python-docx 의 doc.paragraphs 는 문단·런마다 파이썬 객체를 만들어 느리므로
+# 본문 파트(word/document.xml)를 직접 스트리밍하며 본문 문단의 텍스트만 뽑는다.
+_W   = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_NS  = {"w": _W[1:-1]}
+# Paragraph.text 와 같이 문단 직속 런(하이퍼링크 안 런 포함)의 텍스트 요소만 모은다.
+# 글상자(w:txbxContent)·mc:AlternateContent 안의 텍스트는 런 아래 더 깊이 있어 제외된다.
+_RUN_TEXT = etree.XPath(
+    "(w:r | w:hyperlink/w:r)/*[self::w:t or self::w:tab or self::w:ptab or self::w:br"
+    " or self::w:cr or self::w:noBreakHyphen]", namespaces=_NS)
+_RUN_CHAR = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+def _run_text(e: etree._Element) -> str:
+    if e.tag == _W + "t":
+        return e.text or ""
+    if e.tag == _W + "br":          # 줄바꿈만 "\n", 페이지·단 나누기는 ""
+        return "\n" if e.get(_W + "type", "textWrapping") == "textWrapping" else ""
+    return _RUN_CHAR[e.tag]
+
+_REL        = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_XML_PARSER = etree.XMLParser(resolve_entities=False)
+
+def _main_part_name(zf: zipfile.ZipFile) -> str:
+    # python-docx 처럼 _rels/.rels 의 officeDocument 관계로 본문 파트를 찾는다
+    # (word/document2.xml 처럼 저장하는 도구도 있다)
+    rels = etree.fromstring(zf.read("_rels/.rels"), _XML_PARSER)
+    for rel in rels.iter(_REL + "Relationship"):
+        if rel.get("Type", "").endswith("/officeDocument"):
+            return posixpath.normpath(rel.get("Target", "")).lstrip("/")
+    raise KeyError("_rels/.rels 에 officeDocument 관계가 없습니다")
+
+def _iter_paragraph_texts(src: str | IO[bytes]) -> Iterator[str]:
+    with zipfile.ZipFile(src) as zf, zf.open(_main_part_name(zf)) as fp:
+        for _, p in etree.iterparse(fp, tag=_W + "p", resolve_entities=False):
+            if p.getparent().tag != _W + "body":    # 표·글상자 안 문단은 doc.paragraphs 처럼 제외
+                continue
+            # 노드 집합만 고르는 식이라 결과는 항상 요소 목록
+            yield "".join(map(_run_text, cast(list[etree._Element], _RUN_TEXT(p))))
+            p.clear()
+
+def load_questions_from_docx(src: str | IO[bytes]) -> list[Question]:
+    text  = " ".join(s for t in _iter_paragraph_texts(src) if (s := t.strip()))
+
+    questions: list[Question] = []
+    start: int | None = None            # 현재 문항 본문 시작 위치
+    marks: list[re.Match[str]] = []     # 현재 문항의 보기 기호 match 목록
+    for m in _TOKEN_RE.finditer(text):
+        if m.group(1) is None:      # 보기 기호
+            marks.append(m)
             continue
-        q_body     = parts[0].split(".", 1)[-1].strip()
-        raw_choices = [parts[j] + parts[j+1] for j in range(1, len(parts)-1, 2)]
-        if len(raw_choices) < 5:
-            continue
-        choices = {c[0]: c[1:].strip() for c in raw_choices[:5]}
-        questions.append({"question": q_body, "choices": choices})
+        if start is not None and (q := _make_question(text, start, marks, m.start())):
+            questions.append(q)
+        start, marks = m.end(), []
+    if start is not None and (q := _make_question(text, start, marks, len(text))):
+        questions.append(q)
     return questions
 
+# 위젯을 조작할 때마다 스크립트 전체가 다시 실행되므로
+# 업로드 내용(bytes)을 키로 파싱 결과를 캐시해 재파싱을 막는다.
+# Question 은 rerun 마다 새로 정의되는 __main__ 의 클래스라 다른 세션의 rerun 과
+# 겹치면 pickle 이 실패하므로, 캐시에는 일반 tuple 만 넣고 꺼낸 뒤 Question 으로 감싼다.
+@st.cache_data(show_spinner=False)
+def _load_question_tuples(data: bytes) -> list[tuple[str, tuple[str, ...], tuple[str, ...]]]:
+    # zipfile 은 파일 객체도 받으므로 임시 파일 없이 메모리에서 바로 연다
+    return [(q.body, q.keys, q.choices) for q in load_questions_from_docx(io.BytesIO(data))]
+
+def load_questions_from_bytes(data: bytes) -> list[Question]:
+    return [Question._make(t) for t in _load_question_tuples(data)]
+
 # ────────────────────────────────
 def main():
     st.set_page_config(page_title="노무사 기출 (Bing)", page_icon="🧠")
@@ -69,15 +196,10 @@ def main():
         st.info("먼저 Word 파일을 올려 주세요.")
         return
 
-    # 업로드 파일을 임시 위치에 저장
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-        tmp.write(up_file.read())
-        temp_path = tmp.name
-
     try:
-        questions = load_questions_from_docx(temp_path)
-    finally:
-        os.remove(temp_path)        # 파일 정리
+        questions = load_questions_from_bytes(up_file.getvalue())
+    except Exception:               # 깨진 zip·압축·XML 등 어떤 형태든 → 아래 파싱 실패 안내
+        questions = []
 
     if not questions:
         st.error("문제 파싱 실패: ‘숫자. 문제 ①보기…’ 형식인지 확인하세요.")
@@ -86,26 +208,29 @@ def main():
     idx = st.number_input("문제 번호", 1, len(questions), 1, key="idx")
     q   = questions[idx-1]
 
+    # 문제를 읽는 동안 현재·다음 문항 검색을 미리 걸어 둔다
+    prefetch_searches([_search_query(nxt) for nxt in questions[idx-1:idx+2]])
+
     st.subheader(f"문제 {idx}")
-    st.markdown(q["question"])
+    st.markdown(q.body)
 
     sel = st.radio(
         "보기 선택",
-        list(q["choices"].keys()),
-        format_func=lambda k: f"{k}. {q['choices'][k]}",
+        q.keys,
+        format_func=lambda k, c=dict(zip(q.keys, q.choices)): f"{k}. {c[k]}",
         key="sel",
     )
 
     if st.button("검색 결과 보기"):
         with st.spinner("Bing 검색 중..."):
-            results = bing_search(f"{q['question']} 정답 해설")
+            results = bing_search(_search_query(q))
 
         if not results:
             st.warning("검색 결과가 없거나 API 문제일 수 있습니다. 로그를 확인하세요.")
         else:
             st.caption("🔎 상위 검색 결과")
-            for r in results:
-                st.markdown(f"- [{r['name']}]({r['url']})  \n  {r['snippet']}")
+            st.markdown("\n".join(f"- [{r['name']}]({r['url']})  \n  {r['snippet']}"
+                                   for r in results))
             st.info("자세한 해설은 링크를 참고하세요.")
 
 if __name__ == "__main__":